@@ -1,55 +1,25 @@
 """
-Database Helper Functions
+Database Connection Settings
 
-MongoDB helper functions ready to use in your backend code.
-Import and use these functions in your API endpoints for database operations.
+MongoDB connection configuration for the backend. The API creates its Motor
+client through create_client() inside the FastAPI lifespan, so each worker
+process opens its own connection pool on its own event loop.
 """
 
-from pymongo import MongoClient
-from datetime import datetime, timezone
 import os
+from typing import Optional
+
 from dotenv import load_dotenv
-from typing import Union
-from pydantic import BaseModel
+from motor.motor_asyncio import AsyncIOMotorClient
 
 # Load environment variables from .env file
 load_dotenv()
 
-_client = None
-db = None
-
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
-
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-
-    # Convert Pydantic model to dict if needed
-    if isinstance(data, BaseModel):
-        data_dict = data.model_dump()
-    else:
-        data_dict = data.copy()
-
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
-
-    result = db[collection_name].insert_one(data_dict)
-    return str(result.inserted_id)
-
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
-    if limit:
-        cursor = cursor.limit(limit)
-    
-    return list(cursor)
+def create_client() -> Optional[AsyncIOMotorClient]:
+    """Create a Motor client, or None when DATABASE_URL/DATABASE_NAME are not set"""
+    if not (database_url and database_name):
+        return None
+    return AsyncIOMotorClient(database_url)
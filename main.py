@@ -1,23 +1,92 @@
+import asyncio
+import csv
+import io
+import logging
 import os
+import secrets
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Literal, Optional, List
 
-from fastapi import FastAPI, HTTPException, Response
+import msgspec
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from bson import ObjectId
+from bson.errors import InvalidId
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from pymongo import ReturnDocument
 
-from database import db, create_document, get_documents
+from database import create_client, database_url, database_name
 
-app = FastAPI(title="Smart Railway Track Inspection API")
+logger = logging.getLogger(__name__)
+
+_client = None
+db = None
+_cache = None
+
+# Read-heavy dashboard endpoints are cached in Redis (when REDIS_URL is set).
+# Keys embed a generation that every write bumps, so a reader that queried Mongo
+# before a write stores its stale body under a key nobody reads any more
+CACHE_TTL = int(os.getenv("CACHE_TTL", 30))
+CACHE_GEN_KEY = "cache:gen"
+
+INDEXES = [
+    ("inspection", [("section_id", 1), ("created_at", -1)], {}),
+    ("inspection", [("created_at", -1)], {}),
+    ("alert", [("acknowledged", 1), ("created_at", -1)], {}),
+    ("user", [("email", 1)], {"unique": True}),
+]
+
+async def ensure_indexes():
+    """Create the indexes backing the inspection, alert and login queries.
+
+    Runs in the background so an unreachable Mongo or a failing index (e.g.
+    duplicate emails blocking the unique one) is logged instead of stopping boot.
+    """
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except Exception as e:
+            logger.warning("Could not create index %s on %s: %s", keys, collection, e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the Motor client on the running event loop and close it on shutdown"""
+    global _client, db, _cache
+    indexing = None
+    _client = create_client()
+    if _client is not None:
+        db = _client[database_name]
+        indexing = asyncio.create_task(ensure_indexes())
+    if os.getenv("REDIS_URL"):
+        _cache = aioredis.from_url(os.getenv("REDIS_URL"))
+    yield
+    if indexing is not None:
+        indexing.cancel()
+    if _client is not None:
+        _client.close()
+    if _cache is not None:
+        await _cache.aclose()
+
+app = FastAPI(
+    title="Smart Railway Track Inspection API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+FRONTEND_ORIGINS = [o.strip() for o in os.getenv("FRONTEND_ORIGIN", "http://localhost:3000").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=FRONTEND_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
 )
 
 # Helpers
@@ -30,51 +99,143 @@ class PyObjectId(ObjectId):
     def validate(cls, v):
         if isinstance(v, ObjectId):
             return v
-        if not ObjectId.is_valid(v):
-            raise ValueError("Invalid ObjectId")
-        return ObjectId(v)
+        # ObjectId(None) would mint a fresh id, so only parse str/bytes
+        if isinstance(v, (str, bytes)):
+            try:
+                return ObjectId(v)
+            except InvalidId:
+                pass
+        raise ValueError("Invalid ObjectId")
 
 def oid(id_str: str) -> ObjectId:
-    if not ObjectId.is_valid(id_str):
+    # Parse once instead of ObjectId.is_valid followed by ObjectId()
+    try:
+        return ObjectId(id_str)
+    except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid id")
-    return ObjectId(id_str)
+
+def with_id(doc: dict) -> dict:
+    """Replace a document's ObjectId "_id" with a string "id" in place"""
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+# Projections: fetch only the fields each endpoint returns. Section listings
+# return full documents so they match the PATCH/mark/create responses
+INSPECTION_FIELDS = {"section_id": 1, "status": 1, "detail": 1, "inspected_at": 1, "created_at": 1}
+ALERT_FIELDS = {"section_id": 1, "message": 1, "severity": 1, "acknowledged": 1, "created_at": 1}
+SECTION_CSV_FIELDS = {"name": 1, "status": 1, "last_check": 1, "persistent_faults": 1}
+INSPECTION_CSV_FIELDS = {"section_id": 1, "status": 1, "detail": 1, "inspected_at": 1}
 
 # Request models
-class SectionCreate(BaseModel):
+# Hot POST bodies are msgspec Structs decoded straight from the raw request
+# body, skipping FastAPI's Pydantic validation layer
+class SectionCreate(msgspec.Struct):
     name: str
     color_safe: str = "#16a34a"
     color_faulty: str = "#dc2626"
 
 class SectionUpdate(BaseModel):
     name: Optional[str] = None
-    status: Optional[str] = Field(None, pattern="^(safe|faulty)$")
+    status: Optional[Literal["safe", "faulty"]] = None
     color_safe: Optional[str] = None
     color_faulty: Optional[str] = None
 
-class MarkPayload(BaseModel):
-    status: str = Field(..., pattern="^(safe|faulty)$")
+class MarkPayload(msgspec.Struct):
+    status: Literal["safe", "faulty"]
 
-class InspectPayload(BaseModel):
+class InspectPayload(msgspec.Struct):
     section_id: str
-    status: str = Field(..., pattern="^(safe|faulty)$")
+    status: Literal["safe", "faulty"]
     detail: Optional[str] = None
 
-class LoginPayload(BaseModel):
+class LoginPayload(msgspec.Struct):
     name: str
     email: str
 
+async def decode_body(request: Request, model: type):
+    try:
+        return msgspec.json.decode(await request.body(), type=model)
+    except msgspec.DecodeError as e:
+        # Report in the same list-of-errors shape as FastAPI's own 422s. msgspec
+        # only exposes a human-readable message (which already names the field
+        # path), so every error is located at the body and typed by the two
+        # cases it distinguishes: malformed JSON vs a schema mismatch
+        kind = "value_error" if isinstance(e, msgspec.ValidationError) else "json_invalid"
+        raise RequestValidationError([{"type": kind, "loc": ["body"], "msg": str(e)}])
+
+def json_body(schema: dict) -> dict:
+    """openapi_extra documenting a JSON body that the route reads from the request itself"""
+    return {"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": schema}},
+    }}
+
+def struct_schema(model: type) -> dict:
+    return msgspec.json.schema(model)["$defs"][model.__name__]
+
+async def cache_key(name: str) -> Optional[str]:
+    """Key for name under the current generation, or None when the cache is unavailable.
+
+    Must be taken before querying Mongo so a concurrent write invalidates it.
+    """
+    if _cache is None:
+        return None
+    try:
+        gen = await _cache.get(CACHE_GEN_KEY)
+    except RedisError:
+        return None
+    return f"cache:{name}:{int(gen or 0)}"
+
+async def cache_get(key: Optional[str]) -> Optional[Response]:
+    """Return the cached JSON body for key, or None on a miss or cache error"""
+    if key is None:
+        return None
+    try:
+        body = await _cache.get(key)
+    except RedisError:
+        return None
+    return None if body is None else Response(content=body, media_type="application/json")
+
+async def cache_set(key: Optional[str], response: ORJSONResponse) -> ORJSONResponse:
+    """Store an already serialized response body under key and return the response"""
+    if key is not None:
+        try:
+            await _cache.set(key, response.body, ex=CACHE_TTL)
+        except RedisError:
+            pass
+    return response
+
+async def invalidate():
+    """Start a new cache generation, orphaning every previously cached body"""
+    if _cache is not None:
+        try:
+            await _cache.incr(CACHE_GEN_KEY)
+        except RedisError:
+            pass
+
 # Root and health
+# Probes hit /test frequently; listCollections is refreshed at most once per bucket
+COLLECTIONS_TTL = 10
+_collections = (None, [])
+
+async def collection_names() -> List[str]:
+    global _collections
+    bucket = int(time.time()) // COLLECTIONS_TTL
+    if _collections[0] != bucket:
+        _collections = (bucket, await db.list_collection_names())
+    return _collections[1]
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Smart Railway Track Inspection API is running"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
-        "database_url": "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set",
-        "database_name": "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set",
+        "database_url": "✅ Set" if database_url else "❌ Not Set",
+        "database_name": "✅ Set" if database_name else "❌ Not Set",
         "connection_status": "Not Connected",
         "collections": []
     }
@@ -82,21 +243,25 @@ def test_database():
         if db is not None:
             response["database"] = "✅ Connected"
             response["connection_status"] = "Connected"
-            response["collections"] = db.list_collection_names()
+            response["collections"] = await collection_names()
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:80]}"
     return response
 
 # Sections CRUD
-@app.get("/api/sections")
-def list_sections():
-    sections = list(db["tracksection"].find().sort("name"))
-    for s in sections:
-        s["id"] = str(s.pop("_id"))
-    return sections
-
-@app.post("/api/sections", status_code=201)
-def create_section(payload: SectionCreate):
+@app.get("/api/sections", response_model=None)
+async def list_sections():
+    key = await cache_key("sections")
+    cached = await cache_get(key)
+    if cached is not None:
+        return cached
+    cursor = db["tracksection"].find().sort("name")
+    sections = [with_id(s) async for s in cursor]
+    return await cache_set(key, ORJSONResponse(sections))
+
+@app.post("/api/sections", status_code=201, openapi_extra=json_body(struct_schema(SectionCreate)))
+async def create_section(request: Request):
+    payload = await decode_body(request, SectionCreate)
     now = datetime.now(timezone.utc)
     doc = {
         "name": payload.name,
@@ -108,170 +273,238 @@ def create_section(payload: SectionCreate):
         "created_at": now,
         "updated_at": now,
     }
-    inserted_id = db["tracksection"].insert_one(doc).inserted_id
+    inserted_id = (await db["tracksection"].insert_one(doc)).inserted_id
+    await invalidate()
     doc["id"] = str(inserted_id)
     doc.pop("_id", None)
     return doc
 
-@app.patch("/api/sections/{section_id}")
-def update_section(section_id: str, payload: SectionUpdate):
-    updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
+@app.patch("/api/sections/{section_id}", openapi_extra=json_body(SectionUpdate.model_json_schema()))
+async def update_section(section_id: str, request: Request):
+    try:
+        payload = SectionUpdate.model_validate_json(await request.body())
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_input=False)
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in errors])
+    updates = payload.model_dump(exclude_none=True)
     if not updates:
         return {"updated": False}
     updates["updated_at"] = datetime.now(timezone.utc)
-    result = db["tracksection"].update_one({"_id": oid(section_id)}, {"$set": updates})
-    if result.matched_count == 0:
+    s = await db["tracksection"].find_one_and_update(
+        {"_id": oid(section_id)}, {"$set": updates}, return_document=ReturnDocument.AFTER
+    )
+    if s is None:
         raise HTTPException(status_code=404, detail="Section not found")
-    s = db["tracksection"].find_one({"_id": oid(section_id)})
-    s["id"] = str(s.pop("_id"))
-    return s
+    await invalidate()
+    return with_id(s)
 
 @app.delete("/api/sections/{section_id}")
-def delete_section(section_id: str):
-    result = db["tracksection"].delete_one({"_id": oid(section_id)})
+async def delete_section(section_id: str):
+    result = await db["tracksection"].delete_one({"_id": oid(section_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Section not found")
+    await invalidate()
     return {"deleted": True}
 
-@app.post("/api/sections/{section_id}/mark")
-def mark_section(section_id: str, payload: MarkPayload):
-    now = datetime.now(timezone.utc)
-    section = db["tracksection"].find_one({"_id": oid(section_id)})
-    if not section:
+async def apply_status(section_id: str, status: str, last_check: str, now: datetime) -> dict:
+    """Set a section's status in one round-trip and return the updated document.
+
+    Repeat faults are counted against the stored status inside the pipeline
+    update, so no prior read is needed.
+    """
+    persistent_faults = "$persistent_faults"
+    if status == "faulty":
+        persistent_faults = {"$cond": [
+            {"$eq": ["$status", "faulty"]},
+            {"$add": [{"$ifNull": ["$persistent_faults", 0]}, 1]},
+            "$persistent_faults",
+        ]}
+    section = await db["tracksection"].find_one_and_update(
+        {"_id": oid(section_id)},
+        [{"$set": {
+            "status": status,
+            "last_check": last_check,
+            "updated_at": now,
+            "persistent_faults": persistent_faults,
+        }}],
+        return_document=ReturnDocument.AFTER,
+    )
+    if section is None:
         raise HTTPException(status_code=404, detail="Section not found")
-    is_repeat_fault = section.get("status") == "faulty" and payload.status == "faulty"
-    updates = {
-        "status": payload.status,
-        "last_check": datetime.now(timezone.utc).isoformat(),
-        "updated_at": now,
-    }
-    if is_repeat_fault:
-        updates["persistent_faults"] = section.get("persistent_faults", 0) + 1
-    result = db["tracksection"].update_one({"_id": oid(section_id)}, {"$set": updates})
-    # Create inspection record
+    return section
+
+async def record_inspection(insp: dict, alert: Optional[dict] = None):
+    """Insert an inspection record and its alert, if any, concurrently"""
+    writes = [db["inspection"].insert_one(insp)]
+    if alert is not None:
+        writes.append(db["alert"].insert_one(alert))
+    try:
+        await asyncio.gather(*writes)
+    finally:
+        # The section status is already committed even if an insert failed
+        await invalidate()
+
+@app.post("/api/sections/{section_id}/mark", openapi_extra=json_body(struct_schema(MarkPayload)))
+async def mark_section(section_id: str, request: Request):
+    payload = await decode_body(request, MarkPayload)
+    now = datetime.now(timezone.utc)
+    checked_at = now.isoformat()
+    section = await apply_status(section_id, payload.status, checked_at, now)
     insp = {
         "section_id": section_id,
         "status": payload.status,
         "detail": "manual-mark",
-        "inspected_at": datetime.now(timezone.utc).isoformat(),
+        "inspected_at": checked_at,
         "created_at": now,
     }
-    db["inspection"].insert_one(insp)
-    # Create alert if faulty
+    alert = None
     if payload.status == "faulty":
-        db["alert"].insert_one({
+        alert = {
             "section_id": section_id,
             "message": f"Fault detected at section {section.get('name','')}.",
             "severity": "high",
             "acknowledged": False,
             "created_at": now,
-        })
-    s = db["tracksection"].find_one({"_id": oid(section_id)})
-    s["id"] = str(s.pop("_id"))
-    return s
+        }
+    await record_inspection(insp, alert)
+    return with_id(section)
 
 # Inspections
-@app.post("/api/inspect", status_code=201)
-def inspect(payload: InspectPayload):
-    section = db["tracksection"].find_one({"_id": oid(payload.section_id)})
-    if not section:
-        raise HTTPException(status_code=404, detail="Section not found")
+@app.post("/api/inspect", status_code=201, openapi_extra=json_body(struct_schema(InspectPayload)))
+async def inspect(request: Request):
+    payload = await decode_body(request, InspectPayload)
     now = datetime.now(timezone.utc)
+    checked_at = now.isoformat()
+    section = await apply_status(payload.section_id, payload.status, checked_at, now)
     insp = {
         "section_id": payload.section_id,
         "status": payload.status,
         "detail": payload.detail,
-        "inspected_at": now.isoformat(),
+        "inspected_at": checked_at,
         "created_at": now,
     }
-    db["inspection"].insert_one(insp)
-    # Update section
-    is_repeat_fault = section.get("status") == "faulty" and payload.status == "faulty"
-    updates = {
-        "status": payload.status,
-        "last_check": now.isoformat(),
-        "updated_at": now,
-    }
-    if is_repeat_fault:
-        updates["persistent_faults"] = section.get("persistent_faults", 0) + 1
-    db["tracksection"].update_one({"_id": oid(payload.section_id)}, {"$set": updates})
+    alert = None
     if payload.status == "faulty":
-        db["alert"].insert_one({
+        alert = {
             "section_id": payload.section_id,
             "message": f"Fault detected at section {section.get('name','')} (auto)",
             "severity": "high",
             "acknowledged": False,
             "created_at": now,
-        })
+        }
+    await record_inspection(insp, alert)
     return {"created": True}
 
-@app.get("/api/inspections")
-def list_inspections(section_id: Optional[str] = None, limit: int = 50):
+@app.get("/api/inspections", response_model=None)
+async def list_inspections(section_id: Optional[str] = None, limit: int = 50):
     query = {"section_id": section_id} if section_id else {}
-    cursor = db["inspection"].find(query).sort("created_at", -1).limit(limit)
-    inspections = list(cursor)
-    for i in inspections:
-        i["id"] = str(i.pop("_id"))
-    return inspections
+    cursor = db["inspection"].find(query, INSPECTION_FIELDS).sort("created_at", -1).limit(limit)
+    inspections = [with_id(i) async for i in cursor]
+    return ORJSONResponse(inspections)
 
 # Alerts
-@app.get("/api/alerts")
-def list_alerts(only_open: bool = True):
+@app.get("/api/alerts", response_model=None)
+async def list_alerts(only_open: bool = True):
+    key = await cache_key("alerts:open" if only_open else "alerts:all")
+    cached = await cache_get(key)
+    if cached is not None:
+        return cached
     query = {"acknowledged": False} if only_open else {}
-    alerts = list(db["alert"].find(query).sort("created_at", -1).limit(100))
-    for a in alerts:
-        a["id"] = str(a.pop("_id"))
-    return alerts
+    cursor = db["alert"].find(query, ALERT_FIELDS).sort("created_at", -1).limit(100)
+    alerts = [with_id(a) async for a in cursor]
+    return await cache_set(key, ORJSONResponse(alerts))
 
 @app.post("/api/alerts/ack/{alert_id}")
-def ack_alert(alert_id: str):
-    result = db["alert"].update_one({"_id": oid(alert_id)}, {"$set": {"acknowledged": True}})
+async def ack_alert(alert_id: str):
+    result = await db["alert"].update_one({"_id": oid(alert_id)}, {"$set": {"acknowledged": True}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Alert not found")
+    await invalidate()
     return {"acknowledged": True}
 
 # Summary
-@app.get("/api/summary")
-def summary():
-    total = db["tracksection"].count_documents({})
-    safe = db["tracksection"].count_documents({"status": "safe"})
-    faulty = db["tracksection"].count_documents({"status": "faulty"})
-    critical = db["tracksection"].count_documents({"persistent_faults": {"$gte": 3}})
-    return {"total": total, "safe": safe, "faulty": faulty, "critical": critical}
+@app.get("/api/summary", response_model=None)
+async def summary():
+    key = await cache_key("summary")
+    cached = await cache_get(key)
+    if cached is not None:
+        return cached
+    # One round-trip: every counter is computed in a single $facet pass
+    pipeline = [{"$facet": {
+        "total": [{"$count": "n"}],
+        "safe": [{"$match": {"status": "safe"}}, {"$count": "n"}],
+        "faulty": [{"$match": {"status": "faulty"}}, {"$count": "n"}],
+        "critical": [{"$match": {"persistent_faults": {"$gte": 3}}}, {"$count": "n"}],
+    }}]
+    facets = (await db["tracksection"].aggregate(pipeline).to_list(None))[0]
+    count = lambda f: f[0]["n"] if f else 0
+    counts = {k: count(facets[k]) for k in ("total", "safe", "faulty", "critical")}
+    return await cache_set(key, ORJSONResponse(counts))
 
 # Export CSV
+CSV_CHUNK_SIZE = 64 * 1024
+
+async def csv_chunks(header: list, cursor, row):
+    """Stream a cursor as CSV text, flushing the writer buffer every CSV_CHUNK_SIZE chars"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(header)
+    async for doc in cursor:
+        writer.writerow(row(doc))
+        if buf.tell() >= CSV_CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
 @app.get("/api/export/sections", response_class=PlainTextResponse)
-def export_sections_csv():
-    sections = list(db["tracksection"].find().sort("name"))
-    lines = ["id,name,status,last_check,persistent_faults"]
-    for s in sections:
-        lines.append(f"{s.get('_id')},{s.get('name','')},{s.get('status','')},{s.get('last_check','')},{s.get('persistent_faults',0)}")
-    csv_data = "\n".join(lines)
+async def export_sections_csv():
+    cursor = db["tracksection"].find({}, SECTION_CSV_FIELDS).sort("name")
+    rows = csv_chunks(
+        ["id", "name", "status", "last_check", "persistent_faults"],
+        cursor,
+        lambda s: (s["_id"], s.get("name", ""), s.get("status", ""), s.get("last_check", ""), s.get("persistent_faults", 0)),
+    )
     headers = {"Content-Disposition": "attachment; filename=sections.csv"}
-    return Response(content=csv_data, media_type="text/csv", headers=headers)
+    return StreamingResponse(rows, media_type="text/csv", headers=headers)
 
 @app.get("/api/export/inspections", response_class=PlainTextResponse)
-def export_inspections_csv(limit: int = 1000):
-    cursor = db["inspection"].find({}).sort("created_at", -1).limit(limit)
-    lines = ["id,section_id,status,detail,inspected_at"]
-    for i in cursor:
-        lines.append(f"{i.get('_id')},{i.get('section_id','')},{i.get('status','')},{i.get('detail','')},{i.get('inspected_at','')}")
-    csv_data = "\n".join(lines)
+async def export_inspections_csv(limit: int = 1000):
+    cursor = db["inspection"].find({}, INSPECTION_CSV_FIELDS).sort("created_at", -1).limit(limit)
+    rows = csv_chunks(
+        ["id", "section_id", "status", "detail", "inspected_at"],
+        cursor,
+        lambda i: (i["_id"], i.get("section_id", ""), i.get("status", ""), i.get("detail", ""), i.get("inspected_at", "")),
+    )
     headers = {"Content-Disposition": "attachment; filename=inspections.csv"}
-    return Response(content=csv_data, media_type="text/csv", headers=headers)
+    return StreamingResponse(rows, media_type="text/csv", headers=headers)
 
 # Simple multi-user login (demo only)
-@app.post("/api/login")
-def login(payload: LoginPayload):
-    token = f"tok-{abs(hash(payload.email))}"
-    user = db["user"].find_one({"email": payload.email})
-    if not user:
-        db["user"].insert_one({"name": payload.name, "email": payload.email, "role": "viewer", "token": token, "created_at": datetime.now(timezone.utc)})
-    else:
-        db["user"].update_one({"_id": user["_id"]}, {"$set": {"token": token}})
+@app.post("/api/login", openapi_extra=json_body(struct_schema(LoginPayload)))
+async def login(request: Request):
+    payload = await decode_body(request, LoginPayload)
+    token = secrets.token_urlsafe(32)
+    # Single upsert against the unique email index instead of find-then-write
+    await db["user"].update_one(
+        {"email": payload.email},
+        {
+            "$set": {"name": payload.name, "token": token},
+            "$setOnInsert": {"role": "viewer", "created_at": datetime.now(timezone.utc)},
+        },
+        upsert=True,
+    )
     return {"name": payload.name, "email": payload.email, "token": token}
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Each worker runs the lifespan after fork, so Mongo/Redis clients are per-process
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 2)),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning",
+    )